@@ -1,18 +1,23 @@
 import os
-import tempfile
+import re
 import html
+import hashlib
+import time
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
 
-from citations import citation_count_for_year, citation_count_all_years
-from pdf_references import extract_references_from_pdf, annotate_results
-
-
-
+import numpy as np
 import pandas as pd
 import streamlit as st
 from dotenv import load_dotenv
-
-from pdf2pdf import extract_text, generate_embeddings, query_pinecone, prompt_to_query
-from chatpdf import upsert_kb, upsert_pdf_file, chat as kb_chat, clear_kb
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from streamlit.runtime.uploaded_file_manager import UploadedFile
+
+# pdf2pdf, chatpdf, citations and pdf_references are imported inside the
+# functions that use them: they set up Vector Search clients (vs_upsert even
+# probes the indexes) at import, which the Guide page never needs.
+import vertex_client
+from vertex_client import EMBED_MODEL_NAME
 from metadata_store import get_kb_description, set_kb_description, list_kb_documents, delete_kb_document
 from guide import render_section_heading, home_ui
 
@@ -35,13 +40,18 @@ NAV_ITEMS = [
     {"key": "chat",   "label": "Ask Your Library",    "icon": "💬"},
     {"key": "kb",     "label": "Manage Library",      "icon": "📚"},
 ]
+_NAV_KEYS = [item["key"] for item in NAV_ITEMS]
+_NAV_LABELS = {item["key"]: f"{item['icon']}  {item['label']}" for item in NAV_ITEMS}
 
-# Simple in-memory cache for citation counts (all years).
-_CITATION_COUNT_CACHE_ALL_YEARS: dict[str, int] = {}
+# Concurrent OpenCitations/Crossref lookups when fetching counts for many DOIs.
+_CITATION_WORKERS = 8
 
-def apply_needle_theme():
-    st.markdown(
-        """
+# Background arXiv downloads + indexing into the Library.
+_INGEST_WORKERS = 4
+
+_WORD_RE = re.compile(r"\S+")
+
+_NEEDLE_CSS = """
         <style>
         :root {
             --needle-bg: #27343c;
@@ -452,22 +462,86 @@ def apply_needle_theme():
         }
 
         </style>
-        """,
-        unsafe_allow_html=True,
-    )
+        """
 
 
+@st.cache_resource
+def _needle_theme_html() -> str:
+    """Minified theme CSS, built once per process.
 
-def build_sidebar():
-    nav_keys = [item["key"] for item in NAV_ITEMS]
-    nav_labels = {item["key"]: f"{item['icon']}  {item['label']}" for item in NAV_ITEMS}
+    app.py itself is re-executed on every rerun, so the minify pass lives
+    behind st.cache_resource rather than at module level.
+    """
+    css = re.sub(r"/\*.*?\*/", "", _NEEDLE_CSS, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    # Drop spaces around punctuation. Only the space *after* ':' goes, since
+    # one before it can be a descendant combinator ("div :hover").
+    css = re.sub(r"\s*([{};,])\s*", r"\1", css)
+    return re.sub(r":\s+", ":", css).strip()
+
+
+def apply_needle_theme():
+    # Emitted on every run on purpose: Streamlit drops any element a rerun
+    # doesn't re-declare, so skipping this would strip the theme.
+    st.markdown(_needle_theme_html(), unsafe_allow_html=True)
+
+
+
+def _kw(key: str, default) -> dict:
+    """
+    `value=` kwarg for a keyed widget, only when session_state doesn't hold it yet.
+
+    Streamlit raises if a widget gets both a default value and a session value
+    (e.g. after a reset), so in that case the widget reads from session_state.
+    """
+    return {} if key in st.session_state else {"value": default}
+
+
+# Values behind "Reset to recommended defaults" and "Clear Filters".
+_RECOMMENDED_GEN_OPTS = {
+    "temperature": 0.0,
+    "max_output_tokens": 0,
+    "top_k": 0,
+}
+_DEFAULT_FILTERS = {
+    "filter_category": "",
+    "filter_num_papers": 10,
+    "filter_year": "",
+    "filter_author": "",
+    "filter_keywords": "",
+}
+
+
+def _reset_gen_defaults():
+    """
+    on_click for the Reset button.
+
+    Callbacks run before the script, so writing the widget keys here makes the
+    widgets draw with the defaults on this same run (no st.rerun round-trip).
+    """
+    try:
+        # Update the runtime defaults in the vertex client
+        vertex_client.set_gen_options(_RECOMMENDED_GEN_OPTS)
+    except Exception as e:
+        st.session_state["_reset_gen_error"] = f"Failed to set defaults: {e}"
+        return
+    st.session_state["gen_temperature"] = float(_RECOMMENDED_GEN_OPTS["temperature"])
+    st.session_state["gen_max_output_tokens"] = int(_RECOMMENDED_GEN_OPTS["max_output_tokens"])
+    st.session_state["gen_top_k"] = int(_RECOMMENDED_GEN_OPTS["top_k"])
 
+
+def _clear_filters():
+    """on_click for Clear Filters; see _reset_gen_defaults."""
+    st.session_state.update(_DEFAULT_FILTERS)
+
+
+def build_sidebar():
     with st.sidebar:
         st.markdown("<div class='needle-logo'>Needle</div>", unsafe_allow_html=True)
         selected = st.radio(
             "Navigation",
-            options=nav_keys,
-            format_func=lambda key: nav_labels[key],
+            options=_NAV_KEYS,
+            format_func=_NAV_LABELS.__getitem__,
             key="needle_nav",
             label_visibility="collapsed",
         )
@@ -476,163 +550,75 @@ def build_sidebar():
 
         # Model generation configuration controls
         st.markdown("---")
-        try:
-            import vertex_client
-            current_opts = vertex_client.get_gen_options()
-        except Exception:
-            vertex_client = None
-            current_opts = {}
-
-        # If we requested a reset in the previous run, apply those values into
-        # the session state BEFORE widget creation so the widgets show the new values.
-        if st.session_state.pop("_reset_gen_defaults", False):
-            # Prefer explicit reset values if present, otherwise read from vertex_client
-            reset_vals = st.session_state.pop("_reset_gen_vals", None)
-            if not reset_vals and vertex_client is not None:
-                reset_vals = vertex_client.get_gen_options()
-
-            if reset_vals:
-                # set widget-backed keys so the widgets pick these up on creation
-                st.session_state["gen_temperature"] = float(reset_vals.get("temperature", 0.0))
-                st.session_state["gen_max_output_tokens"] = int(reset_vals.get("max_output_tokens", 0))
-                st.session_state["gen_top_k"] = int(reset_vals.get("top_k", 0))
-
-        with st.expander("⚙️ Model Settings (For Experts)", expanded=False):
-            # Build widgets carefully: if a key already exists in session_state
-            # (for example after a reset), avoid passing a `value=` argument to
-            # the widget since Streamlit will raise if a widget is created with
-            # both a default value and a session value. Instead let the widget
-            # read the value from session_state by omitting `value`.
-            if "gen_temperature" in st.session_state:
-                temp = st.slider(
-                    "Temperature",
-                    0.0,
-                    1.0,
-                    step=0.01,
-                    key="gen_temperature",
-                    help="Lower = more deterministic, Higher = more creative",
-                )
-            else:
-                temp = st.slider(
-                    "Temperature",
-                    0.0,
-                    1.0,
-                    value=float(current_opts.get("temperature", 0.0)),
-                    step=0.01,
-                    key="gen_temperature",
-                    help="Lower = more deterministic, Higher = more creative",
-                )
-
-            if "gen_max_output_tokens" in st.session_state:
-                max_tokens = st.number_input(
-                    "Max output tokens (0 = disabled)",
-                    min_value=0,
-                    max_value=65536,
-                    step=1,
-                    key="gen_max_output_tokens",
-                    help="Maximum length of generated response; set to 0 to let the model use its default",
-                )
-            else:
-                max_tokens = st.number_input(
-                    "Max output tokens (0 = disabled)",
-                    min_value=0,
-                    max_value=65536,
-                    value=int(current_opts.get("max_output_tokens", 0)),
-                    step=1,
-                    key="gen_max_output_tokens",
-                    help="Maximum length of generated response; set to 0 to let the model use its default",
-                )
-
-            if "gen_top_k" in st.session_state:
-                top_k = st.number_input(
-                    "Top-k",
-                    min_value=0,
-                    max_value=1000,
-                    step=1,
-                    key="gen_top_k",
-                    help="Number of highest probability tokens to sample from (0 = disabled)",
-                )
-            else:
-                top_k = st.number_input(
-                    "Top-k",
-                    min_value=0,
-                    max_value=1000,
-                    value=int(current_opts.get("top_k", 0)),
-                    step=1,
-                    key="gen_top_k",
-                    help="Number of highest probability tokens to sample from (0 = disabled)",
-                )
-
-            if st.button("Apply Settings", key="apply_gen_opts", use_container_width=True):
-                if vertex_client is None:
-                    st.error("Vertex client not available.")
-                else:
-                    new_opts = {
-                        "temperature": float(temp),
-                        "max_output_tokens": int(max_tokens),
-                        "top_k": int(top_k),
-                    }
-                    try:
-                        vertex_client.set_gen_options(new_opts)
-                        st.success("✓ Settings updated")
-                    except Exception as e:
-                        st.error(f"Failed: {e}")
+        # In-process dict copy; vertex_client is already loaded for EMBED_MODEL_NAME.
+        current_opts = vertex_client.get_gen_options()
+
+        # Both panels are forms: edits stay client-side until a submit button,
+        # so dragging a slider or typing a filter doesn't rerun the app.
+        with st.expander("⚙️ Model Settings (For Experts)", expanded=False), st.form("gen_form", border=False):
+            temp = st.slider(
+                "Temperature",
+                0.0,
+                1.0,
+                step=0.01,
+                key="gen_temperature",
+                help="Lower = more deterministic, Higher = more creative",
+                **_kw("gen_temperature", float(current_opts.get("temperature", 0.0))),
+            )
+            max_tokens = st.number_input(
+                "Max output tokens (0 = disabled)",
+                min_value=0,
+                max_value=65536,
+                step=1,
+                key="gen_max_output_tokens",
+                help="Maximum length of generated response; set to 0 to let the model use its default",
+                **_kw("gen_max_output_tokens", int(current_opts.get("max_output_tokens", 0))),
+            )
+            top_k = st.number_input(
+                "Top-k",
+                min_value=0,
+                max_value=1000,
+                step=1,
+                key="gen_top_k",
+                help="Number of highest probability tokens to sample from (0 = disabled)",
+                **_kw("gen_top_k", int(current_opts.get("top_k", 0))),
+            )
 
-            if st.button("Reset to recommended defaults", key="reset_gen_defaults", use_container_width=True):
-                if vertex_client is None:
-                    st.error("Vertex client not available.")
-                else:
-                    recommended = {
-                        "temperature": 0.0,
-                        "max_output_tokens": 0,
-                        "top_k": 0,
-                    }
-                    try:
-                        # Update the runtime defaults in the vertex client
-                        vertex_client.set_gen_options(recommended)
-                        # Store a flag so the next run can inject these into widget state
-                        st.session_state["_reset_gen_defaults"] = True
-                        st.session_state["_reset_gen_vals"] = recommended
-                        st.rerun()
-                    except Exception as e:
-                        st.error(f"Failed to set defaults: {e}")
+            if st.form_submit_button("Apply Settings", use_container_width=True):
+                new_opts = {
+                    "temperature": float(temp),
+                    "max_output_tokens": int(max_tokens),
+                    "top_k": int(top_k),
+                }
+                try:
+                    vertex_client.set_gen_options(new_opts)
+                    st.success("✓ Settings updated")
+                except Exception as e:
+                    st.error(f"Failed: {e}")
+
+            st.form_submit_button(
+                "Reset to recommended defaults",
+                use_container_width=True,
+                on_click=_reset_gen_defaults,
+            )
+            reset_error = st.session_state.pop("_reset_gen_error", None)
+            if reset_error:
+                st.error(reset_error)
 
         # --- ArXiv Metadata Filters ---
         st.markdown("---")
-        # If we requested a filter reset in the previous run, apply those values into
-        # the session state BEFORE widget creation so the widgets show the new values.
-        if st.session_state.pop("_reset_filters", False):
-            reset_vals = st.session_state.pop("_reset_filter_vals", None)
-            if not reset_vals:
-                reset_vals = {
-                    "filter_category": "",
-                    "filter_num_papers": 10,
-                    "filter_year": "",
-                    "filter_author": "",
-                    "filter_keywords": "",
-                }
-            for k, v in reset_vals.items():
-                st.session_state[k] = v
-
         # Ensure a stable default for Number of Papers
         if "filter_num_papers" not in st.session_state:
             st.session_state["filter_num_papers"] = 10
 
-        with st.expander("🔎 Filters (arXiv metadata)", expanded=False):
+        with st.expander("🔎 Filters (arXiv metadata)", expanded=False), st.form("filters_form", border=False):
             # Conference/category
-            if "filter_category" in st.session_state:
-                category = st.text_input(
-                    "Category (e.g. cs.LG, stat.ML)",
-                    key="filter_category",
-                    help="arXiv subject area, e.g. cs.LG for Machine Learning. See the full taxonomy at https://arxiv.org/category_taxonomy"
-                )
-            else:
-                category = st.text_input(
-                    "Category (e.g. cs.LG, stat.ML)",
-                    value="",
-                    key="filter_category",
-                    help="arXiv subject area, e.g. cs.LG for Machine Learning. See the full taxonomy at https://arxiv.org/category_taxonomy"
-                )
+            category = st.text_input(
+                "Category (e.g. cs.LG, stat.ML)",
+                key="filter_category",
+                help="arXiv subject area, e.g. cs.LG for Machine Learning. See the full taxonomy at https://arxiv.org/category_taxonomy",
+                **_kw("filter_category", ""),
+            )
             # Number of papers (top_k) — rely on session_state for value to avoid resets
             num_papers = st.number_input(
                 "Number of Papers",
@@ -643,59 +629,33 @@ def build_sidebar():
                 help="How many top similar papers to retrieve",
             )
             # Year
-            if "filter_year" in st.session_state:
-                year = st.text_input(
-                    "Year (e.g. 2022)",
-                    key="filter_year",
-                    help="Year of publication (YYYY)"
-                )
-            else:
-                year = st.text_input(
-                    "Year (e.g. 2022)",
-                    value="",
-                    key="filter_year",
-                    help="Year of publication (YYYY)"
-                )
+            year = st.text_input(
+                "Year (e.g. 2022)",
+                key="filter_year",
+                help="Year of publication (YYYY)",
+                **_kw("filter_year", ""),
+            )
             # Author
-            if "filter_author" in st.session_state:
-                author = st.text_input(
-                    "Author (partial or full)",
-                    key="filter_author",
-                    help="Author name (case-insensitive substring match)"
-                )
-            else:
-                author = st.text_input(
-                    "Author (partial or full)",
-                    value="",
-                    key="filter_author",
-                    help="Author name (case-insensitive substring match)"
-                )
+            author = st.text_input(
+                "Author (partial or full)",
+                key="filter_author",
+                help="Author name (case-insensitive substring match)",
+                **_kw("filter_author", ""),
+            )
             # Keywords
-            if "filter_keywords" in st.session_state:
-                keywords = st.text_input(
-                    "Keywords (comma-separated)",
-                    key="filter_keywords",
-                    help="Keywords to match in title or abstract"
-                )
-            else:
-                keywords = st.text_input(
-                    "Keywords (comma-separated)",
-                    value="",
-                    key="filter_keywords",
-                    help="Keywords to match in title or abstract"
-                )
-
-            if st.button("Clear Filters", key="clear_filters", use_container_width=True):
-                reset_vals = {
-                    "filter_category": "",
-                    "filter_num_papers": 10,
-                    "filter_year": "",
-                    "filter_author": "",
-                    "filter_keywords": "",
-                }
-                st.session_state["_reset_filters"] = True
-                st.session_state["_reset_filter_vals"] = reset_vals
-                st.rerun()
+            keywords = st.text_input(
+                "Keywords (comma-separated)",
+                key="filter_keywords",
+                help="Keywords to match in title or abstract",
+                **_kw("filter_keywords", ""),
+            )
+
+            st.form_submit_button("Apply Filters", use_container_width=True)
+            st.form_submit_button(
+                "Clear Filters",
+                use_container_width=True,
+                on_click=_clear_filters,
+            )
 
         # Return selected nav key
 
@@ -703,174 +663,313 @@ def build_sidebar():
 
 
 # -------------------------------------------------------------------
-# Core logic from your original second script (unchanged behavior)
+# Cached backend calls (survive reruns triggered by unrelated widgets)
 # -------------------------------------------------------------------
 
-def _build_results_table(query_matches):
-    """Turn vector search matches into a DataFrame with link + metadata."""
-    table = {
-        "Title": [],
-        "Authors": [],
-        "Abstract": [],
-        "Date": [],
-        "DOI": [],
-        "Link": [],
-        "Similarity Score": [],
-        "Citations": [],
-    }
-
-
-    # --- Filter logic ---
-    def passes_filters(meta):
-        # Category
-        category = st.session_state.get("filter_category", "").strip().lower()
-        if category:
-            meta_cat = str(meta.get("categories", "")).lower()
-            if category not in meta_cat:
-                return False
-        # Year
-        year = st.session_state.get("filter_year", "").strip()
-        if year:
-            meta_year = str(meta.get("latest_creation_date", ""))[:4]
-            if year != meta_year:
-                return False
-        # Author
-        author = st.session_state.get("filter_author", "").strip().lower()
-        if author:
-            meta_authors = str(meta.get("authors", "")).lower()
-            if author not in meta_authors:
-                return False
-        # Keywords
-        keywords = st.session_state.get("filter_keywords", "").strip().lower()
-        if keywords:
-            kw_list = [kw.strip() for kw in keywords.split(",") if kw.strip()]
-            meta_title = str(meta.get("title", "")).lower()
-            meta_abstract = str(meta.get("abstract", "")).lower()
-            if not any(kw in meta_title or kw in meta_abstract for kw in kw_list):
-                return False
-        return True
-
-    for match in query_matches:
-        meta = match.get("metadata") or {}
-        if not passes_filters(meta):
-            continue
+def _prompt_cache_key(prompt: str) -> str:
+    """Case- and whitespace-insensitive form of a prompt, used as the cache key."""
+    return " ".join(prompt.split()).casefold()
 
-        title = meta.get("title") or f"arXiv {match.get('id', '')}"
-        authors = meta.get("authors") or ""
-        abstract = meta.get("abstract") or ""
-        date = meta.get("latest_creation_date") or ""
-        doi = meta.get("doi") or ""
 
-        arxiv_id = meta.get("arxiv_id") or match.get("id") or ""
-        pdf_url = meta.get("pdf_url")
-        if not pdf_url and arxiv_id:
-            pdf_url = f"https://arxiv.org/pdf/{arxiv_id}.pdf"
+@st.cache_data(ttl=3600, show_spinner=False)
+def _cached_prompt_to_query(prompt_key: str, _prompt: str) -> str:
+    # Keyed on prompt_key only (Streamlit skips "_"-prefixed args when hashing),
+    # so re-typed variants of the same prompt reuse one LLM rewrite.
+    from pdf2pdf import prompt_to_query
 
-        citations_str = ""
-        if doi:
-            try:
-                key = str(doi).strip()
-                if key:
-                    cached = _CITATION_COUNT_CACHE_ALL_YEARS.get(key)
-                    if cached is None:
-                        count, _ = citation_count_all_years(key)
-                        _CITATION_COUNT_CACHE_ALL_YEARS[key] = count
-                        citations_str = str(count)
-                    else:
-                        citations_str = str(cached)
-            except Exception as e:
-                print(f"[WARN] Failed to fetch total citations for DOI {doi}: {e}")
-
-        table["Title"].append(title)
-        table["Authors"].append(authors)
-        table["Abstract"].append(abstract)
-        table["Date"].append(date)
-        table["DOI"].append(doi)
-        table["Link"].append(pdf_url or "")
-        table["Similarity Score"].append(match.get("score"))
-        table["Citations"].append(citations_str)
-
-    if not table["Title"]:
+    return prompt_to_query(_prompt)
+
+
+# Embeddings are deterministic per (text, model), so repeats skip the Vertex
+# call. model_name has no default on purpose: st.cache_data hashes only the
+# arguments actually passed, so callers must pass it for a model switch to
+# miss the cache.
+@st.cache_data(ttl=86400, max_entries=1024, show_spinner=False)
+def _cached_generate_document_embedding(text: str, model_name: str):
+    from pdf2pdf import generate_document_embedding
+
+    return generate_document_embedding(text)
+
+
+@st.cache_data(ttl=86400, max_entries=1024, show_spinner=False)
+def _cached_generate_embeddings_batch(texts: tuple[str, ...], model_name: str):
+    from pdf2pdf import generate_embeddings_batch
+
+    return generate_embeddings_batch(texts)
+
+
+@st.cache_data(ttl=600, max_entries=256, show_spinner=False)
+def _cached_query_pinecone(emb_bytes: bytes, n_queries: int, top_k: int):
+    """Query the papers index; keyed on the float32 bytes of the query embedding(s)."""
+    vectors = np.frombuffer(emb_bytes, dtype=np.float32).reshape(n_queries, -1)
+    from pdf2pdf import query_pinecone_many
+
+    return query_pinecone_many(vectors, top_k=top_k)
+
+
+def _embedding_key(emb) -> bytes:
+    return np.asarray(emb, dtype=np.float32).tobytes()
+
+
+@st.cache_data(
+    ttl=3600,
+    show_spinner=False,
+    hash_funcs={UploadedFile: lambda f: hashlib.sha256(f.getbuffer()).digest()},
+)
+def _cached_read_pdf(uploaded_file):
+    """Extract the query text from an uploaded PDF, keyed on its content hash."""
+    from pdf2pdf import extract_text
+
+    return extract_text(uploaded_file.getvalue())
+
+
+@st.cache_data(
+    ttl=3600,
+    show_spinner=False,
+    hash_funcs={UploadedFile: lambda f: hashlib.sha256(f.getbuffer()).digest()},
+)
+def _cached_pdf_references(uploaded_file):
+    """Referenced DOIs / arXiv IDs / URLs in an uploaded PDF (None on failure)."""
+    from pdf_references import extract_references_from_pdf
+
+    try:
+        return extract_references_from_pdf(uploaded_file.getvalue())
+    except Exception as e:
+        print(f"[WARN] failed to extract references from PDF: {e}")
         return None
 
-    df = pd.DataFrame(table)
-    # newest-ish first if date present; fallback to score
-    if "Date" in df.columns and df["Date"].notna().any():
-        df_sorted = df.sort_values(by="Date", ascending=False)
-    else:
-        df_sorted = df.sort_values(by="Similarity Score", ascending=True)
-
-    return df_sorted
-
-def _build_results_table_with_citations(query_matches):
-    """Like _build_results_table, but also adds a 'Cited in PDF' column."""
-    table = {
-        "Title": [],
-        "Authors": [],
-        "Abstract": [],
-        "Link": [],
-        "Date": [],
-        "Similarity Score": [],
-        "DOI": [],
-        "Cited in PDF": [],
-        "Citations": [],
-    }
-
-    for match in query_matches:
-        meta = match.get("metadata") or {}
-
-        title = meta.get("title") or f"arXiv {match.get('id', '')}"
-        authors = meta.get("authors") or ""
-        abstract = meta.get("abstract") or ""
-        date = meta.get("latest_creation_date") or ""
-        doi = meta.get("doi") or ""
-
-        arxiv_id = meta.get("arxiv_id") or match.get("id") or ""
-        pdf_url = meta.get("pdf_url")
-        if not pdf_url and arxiv_id:
-            pdf_url = f"https://arxiv.org/pdf/{arxiv_id}.pdf"
-
-        # cited flag from annotate_results; default False
-        linked = bool(match.get("linked_in_pdf", False))
-
-        citations_str = ""
-        if doi:
-            try:
-                key = str(doi).strip()
-                if key:
-                    cached = _CITATION_COUNT_CACHE_ALL_YEARS.get(key)
-                    if cached is None:
-                        count, _ = citation_count_all_years(key)
-                        _CITATION_COUNT_CACHE_ALL_YEARS[key] = count
-                        citations_str = str(count)
-                    else:
-                        citations_str = str(cached)
-            except Exception as e:
-                print(f"[WARN] Failed to fetch total citations for DOI {doi}: {e}")
-
-        table["Title"].append(title)
-        table["Authors"].append(authors)
-        table["Abstract"].append(abstract)
-        table["Date"].append(date)
-        table["DOI"].append(doi)
-        table["Link"].append(pdf_url or "")
-        table["Similarity Score"].append(match.get("score"))
-        table["Cited in PDF"].append("✅" if linked else "❌")
-        table["Citations"].append(citations_str)
-
-    if not table["Title"]:
+
+@st.cache_data(ttl=86400, show_spinner=False)
+def _cached_citation_count_for_year(doi: str, year: int, use_crossref: bool):
+    from citations import citation_count_for_year
+
+    return citation_count_for_year(doi, year, use_crossref=use_crossref)
+
+
+# Full (count, citing DOIs) result, for the single-DOI citation tools only.
+@st.cache_data(ttl=86400, max_entries=256, show_spinner=False)
+def _cached_citation_count_all_years(doi: str):
+    from citations import citation_count_all_years
+
+    return citation_count_all_years(doi)
+
+
+# Count only, for the results table and bulk lookups: keeps thousands of DOIs
+# cached for a day without holding their citing-DOI lists.
+@st.cache_data(ttl=86400, max_entries=10_000, show_spinner=False)
+def _cached_citation_total(doi: str) -> int:
+    from citations import citation_count_all_years
+
+    return citation_count_all_years(doi)[0]
+
+
+def _run_executor(max_workers: int) -> ThreadPoolExecutor:
+    """Thread pool whose workers share this run's Streamlit context."""
+    return ThreadPoolExecutor(
+        max_workers=max_workers,
+        initializer=add_script_run_ctx,
+        initargs=(None, get_script_run_ctx()),
+    )
+
+
+def _thread_map(fn, items, max_workers: int):
+    """ex.map over a _run_executor pool."""
+    with _run_executor(max_workers) as ex:
+        return list(ex.map(fn, items))
+
+
+# Library reads stream Firestore (list_kb_documents walks every chunk), so
+# they're cached briefly and cleared by every Library write below.
+@st.cache_data(ttl=60, show_spinner=False)
+def _cached_list_kb_documents(limit: int = 200):
+    return list_kb_documents(limit=limit)
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _cached_get_kb_description() -> str:
+    return get_kb_description()
+
+
+@st.cache_resource
+def _ingest_pool() -> ThreadPoolExecutor:
+    """Process-wide pool for arXiv ingestion, so adds don't block the script run."""
+    return ThreadPoolExecutor(max_workers=_INGEST_WORKERS, thread_name_prefix="kb-ingest")
+
+
+# -------------------------------------------------------------------
+# Core logic from your original second script (unchanged behavior)
+# -------------------------------------------------------------------
+
+def _has_min_words(text: str, minimum: int) -> bool:
+    """True once `minimum` words are seen, without splitting the whole text."""
+    return sum(1 for _ in islice(_WORD_RE.finditer(text), minimum)) >= minimum
+
+
+def _sort_results(df: pd.DataFrame) -> pd.DataFrame:
+    """Newest first when dates are present; fallback to score."""
+    # Parse once so the sort compares datetime64 values, not strings.
+    # format="ISO8601" parses each value as ISO 8601 on its own (plain dates,
+    # naive or offset timestamps) instead of inferring one format from the
+    # first row and coercing the rest to NaT; utc=True puts them all in one
+    # datetime64 dtype. cache=True parses repeated date strings once.
+    dates = pd.to_datetime(df["Date"], errors="coerce", format="ISO8601", utc=True, cache=True)
+    if dates.notna().any():
+        order = dates.sort_values(ascending=False, kind="stable", na_position="last").index
+        return df.loc[order]
+    return df.sort_values(by="Similarity Score", ascending=True, kind="stable")
+
+
+def _filter_mask(meta: pd.DataFrame):
+    """
+    Sidebar arXiv metadata filters (category, year, author, keywords) as a row mask.
+
+    Returns None when no filter is set, so callers can skip filtering entirely.
+    """
+    category = st.session_state.get("filter_category", "").strip().lower()
+    year = st.session_state.get("filter_year", "").strip()
+    author = st.session_state.get("filter_author", "").strip().lower()
+    keywords = st.session_state.get("filter_keywords", "").strip().lower()
+    kw_list = [kw.strip() for kw in keywords.split(",") if kw.strip()]
+    if not (category or year or author or kw_list):
         return None
 
-    df = pd.DataFrame(table)
-    # keep the same sort behavior as your original function
-    if "Date" in df.columns and df["Date"].notna().any():
-        df_sorted = df.sort_values(by="Date", ascending=False)
-    else:
-        df_sorted = df.sort_values(by="Similarity Score", ascending=True)
+    mask = pd.Series(True, index=meta.index)
+    # Category
+    if category:
+        mask &= _text_col(meta, "categories").str.lower().str.contains(category, regex=False)
+    # Year
+    if year:
+        mask &= _text_col(meta, "latest_creation_date").str[:4] == year
+    # Author
+    if author:
+        mask &= _text_col(meta, "authors").str.lower().str.contains(author, regex=False)
+    # Keywords
+    if kw_list:
+        # One alternation pass per column instead of one scan per keyword.
+        kw_pat = re.compile("|".join(map(re.escape, kw_list)), re.IGNORECASE)
+        mask &= _text_col(meta, "title").str.contains(kw_pat) | _text_col(meta, "abstract").str.contains(kw_pat)
+    return mask
+
+
+# Successful counts live in _cached_citation_total; only failures are
+# remembered here, briefly, so a broken DOI isn't re-requested (and re-logged)
+# by every search that returns it.
+_CITATION_FAILURE_TTL = 600
+
+
+@st.cache_resource
+def _citation_failures() -> dict:
+    """Process-wide DOI -> time.monotonic() of its last failed lookup."""
+    return {}
+
+
+def _total_citations_str(doi) -> str:
+    """All-years citation count for a DOI as a display string ('' if unavailable)."""
+    key = str(doi).strip()
+    if not key:
+        return ""
+    failures = _citation_failures()
+    failed_at = failures.get(key)
+    if failed_at is not None and time.monotonic() - failed_at < _CITATION_FAILURE_TTL:
+        return ""
+    try:
+        # Kept across reruns/sessions for a day.
+        count = _cached_citation_total(key)
+    except Exception as e:
+        failures[key] = time.monotonic()
+        print(f"[WARN] Failed to fetch total citations for DOI {doi}: {e}")
+        return ""
+    failures.pop(key, None)
+    return str(count)
+
+
+# Metadata fields the results table is built from.
+_RESULT_META_FIELDS = [
+    "title", "authors", "abstract", "latest_creation_date", "doi", "arxiv_id", "pdf_url", "categories",
+]
+
 
-    return df_sorted
+def _text_col(frame: pd.DataFrame, name: str) -> pd.Series:
+    """Metadata column as strings, with missing values as ''."""
+    col = frame[name]
+    return col.where(col.notna(), "").astype(str)
 
 
+def _build_results_table(query_matches, apply_filters: bool = True, cited_in_pdf: bool = False):
+    """
+    Turn vector search matches into a sorted DataFrame with link + metadata.
+
+    Shared by the prompt and PDF flows:
+    - apply_filters: drop matches that fail the sidebar arXiv filters.
+    - cited_in_pdf: add a 'Cited in PDF' column from annotate_results' flag.
+    """
+    if not query_matches:
+        return None
+
+    # One frame from all metadata dicts, then filters and fallbacks column-wise.
+    meta = pd.DataFrame(
+        [m.get("metadata") or {} for m in query_matches],
+        columns=_RESULT_META_FIELDS,
+    )
+    mask = _filter_mask(meta) if apply_filters else None
+    if mask is not None:
+        keep = mask.to_numpy()
+        if not keep.any():
+            return None
+        query_matches = [m for m, k in zip(query_matches, keep) if k]
+        meta = meta[keep].reset_index(drop=True)
+    ids = pd.Series([str(m.get("id") or "") for m in query_matches])
+
+    title = _text_col(meta, "title")
+    title = title.where(title != "", "arXiv " + ids)
+    arxiv_id = _text_col(meta, "arxiv_id")
+    arxiv_id = arxiv_id.where(arxiv_id != "", ids)
+    pdf_url = _text_col(meta, "pdf_url")
+    link = pdf_url.where(
+        pdf_url != "",
+        ("https://arxiv.org/pdf/" + arxiv_id + ".pdf").where(arxiv_id != "", ""),
+    )
+    doi = _text_col(meta, "doi")
+
+    df = pd.DataFrame(
+        {
+            "Title": title,
+            "Authors": _text_col(meta, "authors"),
+            "Abstract": _text_col(meta, "abstract"),
+            "Date": _text_col(meta, "latest_creation_date"),
+            "DOI": doi,
+            "Link": link,
+            "Similarity Score": [m.get("score") for m in query_matches],
+        }
+    )
+    if cited_in_pdf:
+        # cited flag from annotate_results; default False. Two categories, so
+        # the column is int8 codes and Arrow ships the emoji once.
+        linked = np.fromiter((bool(m.get("linked_in_pdf")) for m in query_matches), dtype=np.int8)
+        df["Cited in PDF"] = pd.Categorical.from_codes(linked, categories=["❌", "✅"])
+    # Cold DOIs are separate HTTP round-trips, so look them up concurrently.
+    unique_dois = [d for d in doi.unique() if d]
+    citations = dict(zip(unique_dois, _thread_map(_total_citations_str, unique_dois, _CITATION_WORKERS)))
+    df["Citations"] = doi.map(citations).fillna("")
+
+    return _sort_results(df)
+
+
+def _render_abstract_viewer(df: pd.DataFrame):
+    """Show one result's abstract, picked by title."""
+    with st.expander("📄 Read an abstract", expanded=False):
+        row = st.selectbox(
+            "Paper",
+            options=range(len(df)),
+            format_func=lambda i: df["Title"].iat[i],
+            key="discover_abstract_row",
+        )
+        abstract = df["Abstract"].iat[row] if row is not None else ""
+        if abstract:
+            st.write(abstract)
+        else:
+            st.caption("No abstract available for this paper.")
+
 
 def _render_citation_tools(df: pd.DataFrame):
     """UI to look up citation counts for a selected DOI."""
@@ -891,50 +990,56 @@ def _render_citation_tools(df: pd.DataFrame):
         return
 
     with st.expander("Citation tools for these results"):
-        # What kind of count do we want?
-        mode = st.radio(
-            "What do you want to count?",
-            ("Citations in a specific year", "All citations (all years combined)"),
-            key="citation_mode",
-        )
+        # A form batches the widget changes below into one rerun on submit,
+        # instead of rerunning the whole page on every toggle.
+        with st.form("citation_form", clear_on_submit=False):
+            # What kind of count do we want?
+            mode = st.radio(
+                "What do you want to count?",
+                ("Citations in a specific year", "All citations (all years combined)"),
+                key="citation_mode",
+            )
 
-        # Year is only used in the first mode, but it's fine to always show it
-        target_year = st.number_input(
-            "Year (for single-year count)",
-            min_value=1900,
-            max_value=2100,
-            value=2020,
-            step=1,
-        )
+            # Year is only used in the first mode, but it's fine to always show it
+            target_year = st.number_input(
+                "Year (for single-year count)",
+                min_value=1900,
+                max_value=2100,
+                value=2020,
+                step=1,
+            )
 
-        doi_options = dois_only["DOI"].tolist()
-        selected_doi = st.selectbox(
-            "Select a DOI from the results",
-            doi_options,
-        )
+            doi_options = dois_only["DOI"].tolist()
+            selected_doi = st.selectbox(
+                "Select a DOI from the results",
+                doi_options,
+            )
 
-        use_crossref = st.checkbox(
-            "Use Crossref to refine publication year (slower, more accurate)",
-            value=False,
-        )
-        # <-- this is the explanation line you asked for
-        st.caption(
-            "If checked, Needle will call Crossref for each citing paper to get a more "
-            "accurate publication year before counting citations."
-        )
+            use_crossref = st.checkbox(
+                "Refine publication years from citing-paper metadata (slower, more accurate)",
+                value=False,
+            )
+            # <-- this is the explanation line you asked for
+            st.caption(
+                "If checked, Needle looks up each citing paper's publication year in "
+                "OpenCitations Meta (batched), falling back to Crossref for papers Meta "
+                "doesn't cover, before counting citations."
+            )
 
-        if mode.startswith("Citations in a specific year"):
-            # Single-year count
-            if st.button(
-                "Fetch citation count for this DOI and year",
-                key="btn_citations_year",
-            ):
+            fetch_selected = st.form_submit_button("Fetch citation count for the selected DOI")
+            fetch_all = st.form_submit_button("Fetch counts for all results")
+
+        single_year = mode.startswith("Citations in a specific year")
+
+        if fetch_selected:
+            if single_year:
+                # Single-year count
                 with st.spinner("Looking up citations via OpenCitations..."):
                     try:
-                        count, citing_dois = citation_count_for_year(
+                        count, citing_dois = _cached_citation_count_for_year(
                             selected_doi,
                             int(target_year),
-                            use_crossref=use_crossref,
+                            use_crossref,
                         )
                         st.success(f"{count} citations found in {int(target_year)}.")
 
@@ -944,15 +1049,11 @@ def _render_citation_tools(df: pd.DataFrame):
                                 st.write(cdoi)
                     except Exception as e:
                         st.error(f"Failed to fetch citation data: {e}")
-        else:
-            # All-years combined
-            if st.button(
-                "Fetch total citation count for this DOI",
-                key="btn_citations_all",
-            ):
+            else:
+                # All-years combined
                 with st.spinner("Looking up all-time citations via OpenCitations..."):
                     try:
-                        count, citing_dois = citation_count_all_years(selected_doi)
+                        count, citing_dois = _cached_citation_count_all_years(selected_doi)
                         st.success(f"{count} citations found across all years.")
 
                         if citing_dois:
@@ -962,11 +1063,38 @@ def _render_citation_tools(df: pd.DataFrame):
                     except Exception as e:
                         st.error(f"Failed to fetch citation data: {e}")
 
+        # Same count for every DOI in the results, fetched concurrently.
+        if fetch_all:
+            def _count(doi):
+                try:
+                    if single_year:
+                        return _cached_citation_count_for_year(doi, int(target_year), use_crossref)[0]
+                    return _cached_citation_total(doi)
+                except Exception as e:
+                    print(f"[WARN] Failed to fetch citations for DOI {doi}: {e}")
+                    return None
+
+            # Crossref refinement already runs its own CROSSREF_WORKERS pool per
+            # DOI, so those DOIs go one at a time to keep total requests bounded.
+            workers = 1 if single_year and use_crossref else _CITATION_WORKERS
+            with st.spinner(f"Looking up citations for {len(doi_options)} DOIs..."):
+                counts = _thread_map(_count, doi_options, workers)
+
+            column = f"Citations in {int(target_year)}" if single_year else "Citations (all years)"
+            bulk_df = dois_only[["Title", "DOI"]].assign(**{column: counts})
+            st.dataframe(bulk_df, use_container_width=True, hide_index=True)
+
 
 # --- UI Pieces ---
 
 
+# Fragments: widget interactions inside a page rerun only that page, not the
+# theme, sidebar and heading. (st.fragment is st.experimental_fragment in 1.33.)
+@st.experimental_fragment
 def discover_papers_ui():
+    from pdf2pdf import fuse_matches
+    from pdf_references import annotate_results
+
     with st.form(key="discover_form", clear_on_submit=True):
         user_prompt = st.text_input(
             "Describe what you're looking for (topic, question, idea):",
@@ -995,16 +1123,22 @@ def discover_papers_ui():
             st.session_state.pop("discover_source", None)
         elif has_prompt:
             with st.spinner("Turning your prompt into a search and querying papers..."):
-                rewritten = prompt_to_query(prompt_text)
-                emb = generate_embeddings(rewritten)
+                rewritten = _cached_prompt_to_query(_prompt_cache_key(prompt_text), prompt_text)
+                # Search with both the keyword rewrite and the user's own wording
+                # (one embed call, one index call), then fuse the two rankings.
+                queries = tuple(dict.fromkeys(q for q in (rewritten, prompt_text) if q))
+                embs = _cached_generate_embeddings_batch(queries, EMBED_MODEL_NAME)
                 num_papers = int(st.session_state.get("filter_num_papers", 10))
-                query_results = query_pinecone(emb, top_k=num_papers)
+                query_results = _cached_query_pinecone(_embedding_key(embs), len(embs), num_papers)
                 if not query_results:
                     st.error("No results from the index.")
                     st.session_state.pop("discover_results", None)
                     st.session_state.pop("discover_source", None)
                 else:
-                    query_matches = query_results[0].get("matches", [])
+                    query_matches = fuse_matches(
+                        [r.get("matches", []) for r in query_results],
+                        top_k=num_papers,
+                    )
                     df_sorted = _build_results_table(query_matches)
                     if df_sorted is None:
                         st.error("No usable metadata returned for this query.")
@@ -1015,32 +1149,22 @@ def discover_papers_ui():
                         st.session_state["discover_source"] = "prompt"
         else:
             with st.spinner("Reading your PDF and querying the index..."):
-                fd, tmp_path = tempfile.mkstemp(suffix=".pdf")
-                try:
-                    with os.fdopen(fd, "wb") as f:
-                        f.write(uploaded_file.read())
+                text = _cached_read_pdf(uploaded_file)
+                if not text or not _has_min_words(text, 6):
+                    st.error("Couldn't extract enough text from that PDF.")
+                    st.session_state.pop("discover_results", None)
+                    st.session_state.pop("discover_source", None)
+                    return
 
-                    text = extract_text(tmp_path)
-                    if not text or len(text.split()) <= 5:
-                        st.error("Couldn't extract enough text from that PDF.")
-                        st.session_state.pop("discover_results", None)
-                        st.session_state.pop("discover_source", None)
-                        return
+                # Reference parsing doesn't depend on the search, so it runs
+                # while the embed + index round trips are in flight.
+                with _run_executor(1) as ex:
+                    refs_future = ex.submit(_cached_pdf_references, uploaded_file)
+                    emb = _cached_generate_document_embedding(text, EMBED_MODEL_NAME)
+                    num_papers = int(st.session_state.get("filter_num_papers", 10))
+                    query_results = _cached_query_pinecone(_embedding_key(emb), 1, num_papers)
+                    references = refs_future.result()
 
-                    try:
-                        references = extract_references_from_pdf(tmp_path)
-                    except Exception as e:
-                        print(f"[WARN] failed to extract references from PDF: {e}")
-                        references = None
-                finally:
-                    try:
-                        os.remove(tmp_path)
-                    except OSError:
-                        pass
-
-            emb = generate_embeddings(text)
-            num_papers = int(st.session_state.get("filter_num_papers", 10))
-            query_results = query_pinecone(emb, top_k=num_papers)
             if not query_results:
                 st.error("No results from the index.")
                 st.session_state.pop("discover_results", None)
@@ -1050,7 +1174,7 @@ def discover_papers_ui():
                 if references:
                     query_matches = annotate_results(query_matches, references)
 
-                df_sorted = _build_results_table_with_citations(query_matches)
+                df_sorted = _build_results_table(query_matches, apply_filters=False, cited_in_pdf=True)
                 if df_sorted is None:
                     st.error("No usable metadata returned for this PDF.")
                     st.session_state.pop("discover_results", None)
@@ -1070,8 +1194,10 @@ def discover_papers_ui():
     else:
         st.markdown(f"**Similar papers found (PDF similarity):** {len(df_sorted)}")
 
-    st.data_editor(
-        df_sorted,
+    # Read-only view: st.dataframe skips data_editor's edit-state bookkeeping.
+    # Abstracts stay out of the table payload; they're shown on demand below.
+    st.dataframe(
+        df_sorted.drop(columns="Abstract"),
         use_container_width=True,
         hide_index=True,
         column_config={
@@ -1082,14 +1208,50 @@ def discover_papers_ui():
         },
     )
 
+    _render_abstract_viewer(df_sorted)
     _render_citation_tools(df_sorted)
 
 
+def _render_ingest_status():
+    """Status list for background arXiv ingestion jobs started from this session."""
+    jobs = st.session_state.get("kb_ingest_jobs") or []
+    if not jobs:
+        return
+
+    pending = 0
+    finished = 0
+    for aid, fut in jobs:
+        if not fut.done():
+            pending += 1
+            st.write(f"⏳ {aid}: downloading and indexing...")
+            continue
+        finished += 1
+        if fut.exception() is not None:
+            st.write(f"❌ {aid}: failed to add paper: {fut.exception()}")
+        else:
+            st.write(f"✅ {aid}: added to Library.")
+
+    # Jobs that finished since the last run changed the Library; drop the cached listing.
+    if finished != st.session_state.get("kb_ingest_finished", 0):
+        st.session_state["kb_ingest_finished"] = finished
+        _cached_list_kb_documents.clear()
+
+    if pending:
+        st.button("Refresh status", key="kb_ingest_refresh")
+    elif st.button("Dismiss", key="kb_ingest_dismiss"):
+        st.session_state["kb_ingest_jobs"] = []
+        st.session_state["kb_ingest_finished"] = 0
+        st.rerun()
+
+
+@st.experimental_fragment
 def update_kb_ui():
+    from chatpdf import clear_kb, upsert_kb, upsert_pdf_file
+
     # --- KB description / overview ---
     st.subheader("Library Overview")
 
-    current_desc = get_kb_description()
+    current_desc = _cached_get_kb_description()
     new_desc = st.text_area(
         "Description of your Library (optional):",
         value=current_desc,
@@ -1098,26 +1260,30 @@ def update_kb_ui():
     )
     if st.button("Save Library description"):
         set_kb_description(new_desc)
+        _cached_get_kb_description.clear()
         st.success("Library description updated.")
 
     st.markdown("---")
 
     # --- Add to Library: arXiv ---
     st.subheader("Add by arXiv ID")
-    arxiv_id = st.text_input(
-        "arXiv ID (e.g. 1412.6980):",
+    arxiv_ids_raw = st.text_input(
+        "arXiv ID(s), comma-separated (e.g. 1412.6980, 1706.03762):",
         key="kb_arxiv_id",
     )
-    if st.button("Add paper to Library"):
-        if not arxiv_id.strip():
+    if st.button("Add paper(s) to Library"):
+        arxiv_ids = list(dict.fromkeys(a for a in re.split(r"[,\s]+", arxiv_ids_raw) if a))
+        if not arxiv_ids:
             st.error("Enter an arXiv ID.")
         else:
-            try:
-                with st.spinner("Downloading and indexing paper into Library..."):
-                    upsert_kb(arxiv_id.strip())
-                st.success(f"Paper {arxiv_id.strip()} added to Library.")
-            except Exception as e:
-                st.error(f"Failed to add paper: {e}")
+            # Each paper downloads + indexes on the shared pool; the page keeps
+            # working and reports progress below.
+            jobs = st.session_state.setdefault("kb_ingest_jobs", [])
+            pool = _ingest_pool()
+            for aid in arxiv_ids:
+                jobs.append((aid, pool.submit(upsert_kb, aid)))
+
+    _render_ingest_status()
 
     st.markdown("---")
 
@@ -1136,33 +1302,26 @@ def update_kb_ui():
         if not uploaded_pdf:
             st.error("Upload a PDF first.")
         else:
-            fd, tmp_path = tempfile.mkstemp(suffix=".pdf")
-            with os.fdopen(fd, "wb") as f:
-                f.write(uploaded_pdf.read())
-
             try:
                 # Prefer user-supplied title; fall back to original filename
                 fallback_title = os.path.splitext(uploaded_pdf.name)[0]
                 effective_title = (custom_title or fallback_title).strip()
 
                 with st.spinner("Indexing uploaded PDF into Library..."):
-                    doc_id_prefix = upsert_pdf_file(tmp_path, title=effective_title)
+                    # Parsed straight from the upload buffer; no temp file.
+                    doc_id_prefix = upsert_pdf_file(uploaded_pdf.getvalue(), title=effective_title)
+                _cached_list_kb_documents.clear()
 
                 st.success(f"Uploaded PDF added to Library: {effective_title}")
             except Exception as e:
                 st.error(f"Failed to index uploaded PDF: {e}")
-            finally:
-                try:
-                    os.remove(tmp_path)
-                except OSError:
-                    pass
 
     st.markdown("---")
 
     # --- Browse Library ---
     st.subheader("Browse Library")
 
-    kb_docs = list_kb_documents(limit=200)
+    kb_docs = _cached_list_kb_documents(limit=200)
     if not kb_docs:
         st.info("Your Library is currently empty.")
     else:
@@ -1182,11 +1341,10 @@ def update_kb_ui():
             disabled=True,
         )
 
-        # simple select+delete UI
-        label_to_id = {
-            f"{row['title']} [{row['source']}] ({row['doc_id']})": row["doc_id"]
-            for row in kb_docs
-        }
+        # simple select+delete UI; labels built column-wise from the same frame
+        doc_ids = df["doc_id"].astype(str)
+        labels = df["title"].astype(str) + " [" + df["source"].astype(str) + "] (" + doc_ids + ")"
+        label_to_id = dict(zip(labels, doc_ids))
 
         selected_label = st.selectbox(
             "Remove a specific document from the Library:",
@@ -1198,6 +1356,7 @@ def update_kb_ui():
             if st.button("Delete selected document from Library"):
                 with st.spinner(f"Deleting {selected_label} ..."):
                     deleted = delete_kb_document(doc_id_prefix)
+                _cached_list_kb_documents.clear()
                 st.success(f"Deleted {deleted} chunks for {selected_label}.")
                 st.rerun()
 
@@ -1217,84 +1376,98 @@ def update_kb_ui():
         with st.spinner("Clearing Library..."):
             try:
                 deleted = clear_kb()
+                _cached_list_kb_documents.clear()
                 st.success(f"Cleared Library ({deleted} chunks removed).")
             except Exception as e:
                 st.error(f"Failed to clear Library: {e}")
 
 
 
-def chat_with_research_ui():
-    desc = get_kb_description()
-    if "chat_history" not in st.session_state:
-        st.session_state["chat_history"] = []
-
-    history = st.session_state["chat_history"]
+# Messages shown before "Show earlier messages".
+_CHAT_RECENT_MESSAGES = 20
 
-    tooltip_text = (
-        "Library is the set of documents that are present in our model's "
-        "'memory'. You can generate summary for these documents and ask specific "
-        "questions about them. To update the Library please refer to 'Manage Library'."
-    )
-    warning_html = f"""
-        <div class="kb-warning">
-            <span class="kb-warning-icon">⚠️</span>
-            <span class="kb-warning-text">The answers are based on the documents available in Library</span>
-            <span class="kb-tooltip" data-tooltip="{html.escape(tooltip_text)}">❔</span>
-        </div>
-    """.strip()
-
-    # Show history
-    warning_shown = False
-    for msg in history:
-        role = msg.get("role")
-        content = msg.get("content", "")
-        escaped_content = html.escape(content).replace("\n", "<br>")
-        if role == "assistant":
-            if not warning_shown:
-                st.markdown(warning_html, unsafe_allow_html=True)
-                warning_shown = True
-            assistant_html = f"""
-                <div class="kb-chat-row kb-chat-row-assistant">
-                    <div class="kb-chat-bubble kb-chat-bubble-assistant">
-                        <div class="kb-chat-meta">Assistant</div>
-                        <div class="kb-chat-text">{escaped_content}</div>
-                    </div>
-                </div>
-            """
-            st.markdown(assistant_html, unsafe_allow_html=True)
-        elif role == "user":
-            user_html = f"""
-                <div class="kb-chat-row kb-chat-row-user">
-                    <div class="kb-chat-bubble kb-chat-bubble-user">
-                        <div class="kb-chat-meta">You</div>
-                        <div class="kb-chat-text">{escaped_content}</div>
-                    </div>
+_KB_TOOLTIP_TEXT = (
+    "Library is the set of documents that are present in our model's "
+    "'memory'. You can generate summary for these documents and ask specific "
+    "questions about them. To update the Library please refer to 'Manage Library'."
+)
+_KB_WARNING_HTML = f"""
+    <div class="kb-warning">
+        <span class="kb-warning-icon">⚠️</span>
+        <span class="kb-warning-text">The answers are based on the documents available in Library</span>
+        <span class="kb-tooltip" data-tooltip="{html.escape(_KB_TOOLTIP_TEXT)}">❔</span>
+    </div>
+""".strip()
+
+
+def _chat_bubble_html(role: str, content: str) -> str:
+    """Themed bubble markup for one message."""
+    escaped_content = html.escape(content).replace("\n", "<br>")
+    if role == "assistant":
+        row_class, bubble_class, label = "kb-chat-row-assistant", "kb-chat-bubble-assistant", "Assistant"
+    else:
+        row_class, bubble_class, label = "kb-chat-row-user", "kb-chat-bubble-user", "You"
+    return f"""
+            <div class="kb-chat-row {row_class}">
+                <div class="kb-chat-bubble {bubble_class}">
+                    <div class="kb-chat-meta">{label}</div>
+                    <div class="kb-chat-text">{escaped_content}</div>
                 </div>
-            """
-            st.markdown(user_html, unsafe_allow_html=True)
+            </div>
+        """
 
-    if st.button("Clear conversation", key="kb_clear_chat"):
-        st.session_state["chat_history"] = []
-        st.rerun()
 
-    st.markdown("---")
+def _render_chat_message(role: str, content: str) -> None:
+    """One themed chat bubble (assistant left, user right)."""
+    if role not in ("assistant", "user"):
+        return
+    st.markdown(_chat_bubble_html(role, content), unsafe_allow_html=True)
 
-    with st.form("kb_chat_form", clear_on_submit=True):
-        user_input = st.text_input(
-            "Ask a question about papers in your Library:",
-            key="kb_chat_input",
-        )
-        sent = st.form_submit_button("Send")
 
-    if sent and user_input.strip():
+def chat_with_research_ui():
+    from chatpdf import HISTORY_WINDOW, chat as kb_chat
+
+    if "chat_history" not in st.session_state:
+        st.session_state["chat_history"] = []
+
+    history = st.session_state["chat_history"]
+
+    # Pinned to the bottom of the page; the value is available on this run.
+    prompt = st.chat_input("Ask a question about papers in your Library:")
+
+    # Show history: every turn adds a user + assistant pair, so a non-empty
+    # history always has an answer to caveat.
+    if history:
+        st.markdown(_KB_WARNING_HTML, unsafe_allow_html=True)
+
+    # Only the latest messages render by default; older ones on request.
+    older = history[:-_CHAT_RECENT_MESSAGES]
+    if older and st.toggle(f"Show earlier messages ({len(older)})", key="kb_show_earlier"):
+        for msg in older:
+            _render_chat_message(msg.get("role"), msg.get("content", ""))
+    for msg in history[-_CHAT_RECENT_MESSAGES:]:
+        _render_chat_message(msg.get("role"), msg.get("content", ""))
+
+    # New turn: append below the existing bubbles instead of rerunning.
+    if prompt and prompt.strip():
+        user_input = prompt.strip()
+        _render_chat_message("user", user_input)
         with st.spinner("Thinking with your Library..."):
             try:
-                answer, updated_history = kb_chat(user_input.strip(), history)
+                # Only the trailing window reaches the model; the full history
+                # stays in session_state for display.
+                answer, updated_window = kb_chat(user_input, history[-HISTORY_WINDOW:])
             except Exception as e:
                 st.error(f"Chat failed: {e}")
                 return
 
-        st.session_state["chat_history"] = updated_history
+        if not history:
+            st.markdown(_KB_WARNING_HTML, unsafe_allow_html=True)
+        history.extend(updated_window[-2:])
+        _render_chat_message("assistant", answer)
+
+    if st.button("Clear conversation", key="kb_clear_chat"):
+        st.session_state["chat_history"] = []
         st.rerun()
 
 
@@ -1,10 +1,11 @@
+import hashlib
 import os
 import tempfile
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Union
 
 import arxiv
+import fitz  # PyMuPDF
 import requests
-from langchain_community.document_loaders import PyMuPDFLoader
 
 from vertex_client import embed_texts, generate_text
 from vertex_vs_client import query_kb
@@ -19,6 +20,9 @@ EMBED_DIM = int(os.getenv("VERTEX_EMBED_DIM", "768"))
 TOP_K = int(os.getenv("KB_TOP_K", "5"))
 # Include N recent user turns when building the retrieval query.
 RECENT_USER_TURNS = int(os.getenv("KB_RECENT_USER_TURNS", "3"))
+# Trailing messages chat() reads: the last 6 for the prompt, plus enough for the
+# recent user turns and the last assistant citations. Older ones can be omitted.
+HISTORY_WINDOW = max(6, 2 * RECENT_USER_TURNS)
 
 
 # --- Helpers ---
@@ -122,10 +126,14 @@ def _download_arxiv_pdf(arxiv_id: str) -> Tuple[str, Any]:
     return tmp_path, result
 
 
-def _extract_full_text(pdf_path: str) -> str:
-    loader = PyMuPDFLoader(pdf_path)
-    docs = loader.load()
-    text = " ".join(doc.page_content for doc in docs)
+def _extract_full_text(pdf: Union[str, bytes]) -> str:
+    """Full text of a PDF path or in-memory PDF bytes."""
+    if isinstance(pdf, (bytes, bytearray)):
+        doc = fitz.open(stream=pdf, filetype="pdf")
+    else:
+        doc = fitz.open(pdf)
+    with doc:
+        text = " ".join(page.get_text("text") for page in doc)
     return text.replace("\n", " ")
 
 
@@ -181,16 +189,24 @@ def upsert_kb(arxiv_id: str) -> None:
     upsert_kb_chunks_metadata(kb_meta_items)
 
 
-def upsert_pdf_file(pdf_path: str, title: str | None = None) -> str:
-    """Chunk a local PDF file and upsert it into the Library (Vertex index + Firestore). Returns the document id used."""
-    if not os.path.exists(pdf_path):
-        raise FileNotFoundError(f"PDF not found: {pdf_path}")
+def upsert_pdf_file(pdf: Union[str, bytes], title: str | None = None) -> str:
+    """
+    Chunk a PDF and upsert it into the Library (Vertex index + Firestore). Returns the document id used.
+
+    pdf: a local file path, or the raw PDF bytes (e.g. a Streamlit upload). Bytes
+    are identified by a content hash, so re-uploading the same file overwrites it.
+    """
+    if isinstance(pdf, (bytes, bytearray)):
+        doc_slug = hashlib.sha256(pdf).hexdigest()[:16]
+    else:
+        if not os.path.exists(pdf):
+            raise FileNotFoundError(f"PDF not found: {pdf}")
+        doc_slug = os.path.splitext(os.path.basename(pdf))[0]
 
-    full_text = _extract_full_text(pdf_path)
+    full_text = _extract_full_text(pdf)
     chunks = _chunk_text(full_text)
     vectors = _embed_chunks(chunks)
 
-    doc_slug = os.path.splitext(os.path.basename(pdf_path))[0]
     doc_id_prefix = f"upload-{doc_slug}"
     summary = (chunks[0] if chunks else full_text)[:600]
 
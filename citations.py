@@ -1,12 +1,38 @@
 import os
-from typing import List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
 from urllib.parse import quote
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 OPENCITATIONS_BASE = "https://api.opencitations.net/index/v2"
+OC_META_BASE = "https://api.opencitations.net/meta/v1"
 CROSSREF_BASE = "https://api.crossref.org/works/"
 
+# DOIs per OpenCitations Meta /metadata request (ids joined with '__' in the URL).
+OC_META_BATCH = int(os.getenv("OC_META_BATCH", "50"))
+
+# Concurrent Crossref year lookups (one request per citing DOI).
+CROSSREF_WORKERS = int(os.getenv("CROSSREF_WORKERS", "16"))
+
+# Shared session: keep-alive + TLS reuse across lookups and worker threads.
+# Connect errors, rate limits and transient 5xx are retried with short
+# backoff; once retries run out the last response is returned so
+# raise_for_status() still applies. Read timeouts aren't retried and
+# Retry-After is ignored, so one slow call can't stall a script run.
+_RETRY = Retry(
+    total=3,
+    read=0,
+    backoff_factor=0.2,
+    status_forcelist=(429, 500, 502, 503, 504),
+    respect_retry_after_header=False,
+    raise_on_status=False,
+)
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(pool_maxsize=CROSSREF_WORKERS, max_retries=_RETRY))
+
 
 def _extract_doi_from_citing_field(citing: str) -> Optional[str]:
     """
@@ -57,7 +83,7 @@ def _fetch_opencitations_citations(doi: str, oc_token: Optional[str] = None):
         headers["access-token"] = oc_token
 
     try:
-        resp = requests.get(url, headers=headers, timeout=30)
+        resp = _SESSION.get(url, headers=headers, timeout=30)
         if resp.status_code == 403:
             # Graceful degrade – no citations instead of exploding
             return []
@@ -103,6 +129,50 @@ def _get_citation_year_from_opencitations(row: dict) -> Optional[int]:
         return None
 
 
+def fetch_years_via_oc_meta(
+    dois: List[str],
+    oc_token: Optional[str] = None,
+) -> Dict[str, int]:
+    """
+    Publication years for many DOIs from OpenCitations Meta, OC_META_BATCH per request.
+
+    Returns {lowercased doi: year}. DOIs Meta doesn't know (or batches that
+    fail) are simply missing, so callers can fall back to Crossref for them.
+    """
+    headers = {
+        "User-Agent": f"needle-research-assistant (mailto:{os.getenv('CROSSREF_MAILTO', 'noreply@example.com')})"
+    }
+    if oc_token:
+        headers["access-token"] = oc_token
+
+    years: Dict[str, int] = {}
+    for start in range(0, len(dois), OC_META_BATCH):
+        batch = dois[start : start + OC_META_BATCH]
+        ids = "__".join(f"doi:{quote(d, safe='/')}" for d in batch)
+        try:
+            resp = _SESSION.get(f"{OC_META_BASE}/metadata/{ids}", headers=headers, timeout=30)
+            resp.raise_for_status()
+            records = resp.json()
+        except (requests.RequestException, ValueError) as e:
+            print(f"[WARN] OpenCitations Meta request failed: {e}")
+            continue
+        if not isinstance(records, list):
+            print(f"[WARN] Unexpected OpenCitations Meta response: {records!r}")
+            continue
+
+        for rec in records:
+            # pub_date is "YYYY", "YYYY-MM" or "YYYY-MM-DD" (or empty)
+            pub_date = str(rec.get("pub_date") or "")
+            if len(pub_date) < 4 or not pub_date[:4].isdigit():
+                continue
+            # id holds every identifier of the record: "doi:10.x/abc omid:br/..."
+            for token in str(rec.get("id") or "").split():
+                if token.startswith("doi:"):
+                    years[token[4:].lower()] = int(pub_date[:4])
+
+    return years
+
+
 def _get_year_from_crossref(
     doi: str,
     mailto: Optional[str] = None,
@@ -120,7 +190,7 @@ def _get_year_from_crossref(
     else:
         headers["User-Agent"] = "research-assistant-citations"
 
-    resp = requests.get(url, headers=headers, timeout=30)
+    resp = _SESSION.get(url, headers=headers, timeout=30)
     if resp.status_code == 404:
         return None
     resp.raise_for_status()
@@ -163,7 +233,8 @@ def citation_count_for_year(
     - year: target year (e.g. 2020)
     - use_crossref:
         False = use OpenCitations 'creation' date only (fast)
-        True  = get year from Crossref if possible (slower, more network)
+        True  = refine the year from the citing paper's metadata: OpenCitations
+                Meta in batches, Crossref for DOIs Meta doesn't cover
     """
     if oc_token is None:
         oc_token = os.getenv("OPENCITATIONS_TOKEN")
@@ -172,18 +243,28 @@ def citation_count_for_year(
         crossref_mailto = os.getenv("CROSSREF_MAILTO")
 
     rows = _fetch_opencitations_citations(doi, oc_token=oc_token)
-    matches: List[str] = []
-
+    cited: List[Tuple[str, dict]] = []
     for row in rows:
         citing_doi = _extract_doi_from_citing_field(row.get("citing", ""))
-        if not citing_doi:
-            continue
+        if citing_doi:
+            cited.append((citing_doi, row))
+
+    # Publication years: one OC Meta request per OC_META_BATCH DOIs, then
+    # Crossref (one request per DOI, overlapped) only for what Meta missed.
+    meta_years: Dict[str, Optional[int]] = {}
+    if use_crossref and cited:
+        unique = list(dict.fromkeys(citing_doi.lower() for citing_doi, _ in cited))
+        meta_years.update(fetch_years_via_oc_meta(unique, oc_token=oc_token))
+        missing = [d for d in unique if d not in meta_years]
+        if missing:
+            with ThreadPoolExecutor(max_workers=CROSSREF_WORKERS) as ex:
+                years = ex.map(lambda d: _get_year_from_crossref(d, mailto=crossref_mailto), missing)
+                meta_years.update(zip(missing, years))
 
-        if use_crossref:
-            pub_year = _get_year_from_crossref(citing_doi, mailto=crossref_mailto)
-            if pub_year is None:
-                pub_year = _get_citation_year_from_opencitations(row)
-        else:
+    matches: List[str] = []
+    for citing_doi, row in cited:
+        pub_year = meta_years.get(citing_doi.lower())
+        if pub_year is None:
             pub_year = _get_citation_year_from_opencitations(row)
 
         if pub_year == year:
@@ -21,19 +21,23 @@ SECTION_COPY = {
 }
 
 
-def render_section_heading(mode_key: str) -> None:
-    copy = SECTION_COPY.get(mode_key)
-    if not copy:
-        return
-    st.markdown(
-        f"""
+# Section headings are static, so render their HTML once at import.
+_SECTION_HTML = {
+    key: f"""
         <div class="needle-section-title">
             <h2>{copy['title']}</h2>
             <p>{copy['subtitle']}</p>
         </div>
-        """,
-        unsafe_allow_html=True,
-    )
+        """
+    for key, copy in SECTION_COPY.items()
+}
+
+
+def render_section_heading(mode_key: str) -> None:
+    heading = _SECTION_HTML.get(mode_key)
+    if not heading:
+        return
+    st.markdown(heading, unsafe_allow_html=True)
 
 
 def home_ui() -> None:
@@ -7,6 +7,8 @@ from dotenv import load_dotenv
 load_dotenv()
 
 from google.cloud import firestore
+from google.cloud.firestore_v1.base_query import FieldFilter
+from google.cloud.firestore_v1.field_path import FieldPath
 
 PROJECT_ID = os.getenv("GOOGLE_CLOUD_PROJECT")
 if not PROJECT_ID:
@@ -166,45 +168,33 @@ def clear_kb_chunks() -> int:
     Delete all documents in kb_chunks.
     Returns: number of docs deleted.
     """
-    col = _db.collection("kb_chunks")
-    docs_iter = col.stream()
-
-    batch = _db.batch()
-    count = 0
-
-    for i, doc in enumerate(docs_iter, start=1):
-        batch.delete(doc.reference)
-        count = i
-        if i % 400 == 0:
-            batch.commit()
-            batch = _db.batch()
+    # recursive_delete pages through the collection and deletes via a BulkWriter
+    # (batched, parallel commits).
+    return _db.recursive_delete(_db.collection("kb_chunks"))
 
-    if count and (count % 400 != 0):
-        batch.commit()
 
-    return count
 def delete_kb_document(doc_id_prefix: str) -> int:
     """
     Delete all kb_chunks whose document id starts with doc_id_prefix.
     Returns number of chunks deleted.
     """
     col = _db.collection("kb_chunks")
-    docs_iter = col.stream()
+    prefix = str(doc_id_prefix)
 
-    batch = _db.batch()
-    count = 0
+    # our chunk ids look like f"{doc_id_prefix}_{i}". "`" sorts right after "_",
+    # so this id range is exactly that document's chunks; only ids are fetched.
+    doc_id = FieldPath.document_id()
+    query = (
+        col.where(filter=FieldFilter(doc_id, ">=", col.document(prefix + "_")))
+        .where(filter=FieldFilter(doc_id, "<", col.document(prefix + "`")))
+        .select([doc_id])
+    )
 
-    prefix = str(doc_id_prefix)
-    # our chunk ids look like f"{doc_id_prefix}_{i}"
-    for doc in docs_iter:
-        if doc.id.startswith(prefix + "_"):
-            batch.delete(doc.reference)
-            count += 1
-            if count % 400 == 0:
-                batch.commit()
-                batch = _db.batch()
-
-    if count and (count % 400 != 0):
-        batch.commit()
+    writer = _db.bulk_writer()
+    count = 0
+    for doc in query.stream():
+        writer.delete(doc.reference)
+        count += 1
+    writer.close()
 
     return count
@@ -1,20 +1,29 @@
 import os
 from typing import List, Union
 
-from langchain_community.document_loaders import PyMuPDFLoader
+import fitz  # PyMuPDF
+import numpy as np
 
 from vertex_client import embed_texts, generate_text
-from vertex_vs_client import query_papers
+from vertex_vs_client import query_papers_many
 
 TOP_K = int(os.getenv("PAPERS_TOP_K", "10"))
 
+# Words per chunk when embedding a whole document (~512 tokens each).
+DOC_CHUNK_WORDS = 380
 
-def extract_text(file_path: str) -> str:
-    """Extract text from the uploaded PDF. Simple version: full text, trimmed."""
-    loader = PyMuPDFLoader(file_path)
-    docs = loader.load()
 
-    text = " ".join(doc.page_content for doc in docs)
+def extract_text(source: Union[str, bytes]) -> str:
+    """Extract text from a PDF path or in-memory PDF bytes. Simple version: full text, trimmed."""
+    if isinstance(source, (bytes, bytearray)):
+        # Parse straight from memory; no temp file round-trip.
+        doc = fitz.open(stream=source, filetype="pdf")
+    else:
+        doc = fitz.open(source)
+
+    with doc:
+        text = " ".join(page.get_text("text") for page in doc)
+
     text = text.replace("\n", " ")
     words = text.split()
 
@@ -28,15 +37,45 @@ def generate_embeddings(text: Union[str, List[str]]):
     return vectors[0]
 
 
-def query_pinecone(embedding, top_k: int = TOP_K):
-    """Now actually queries Vertex Vector Search vs-papers-index."""
-    if embedding is None:
+def generate_embeddings_batch(texts: List[str]) -> List[List[float]]:
+    """Return one embedding vector per string, using batched Vertex calls."""
+    return embed_texts(list(texts))
+
+
+def generate_document_embedding(text: str) -> List[float]:
+    """
+    Single query vector for a long document.
+
+    The text is split into ~512-token chunks (the embedding model truncates
+    long inputs), all chunks are embedded in one batched call, and the chunk
+    vectors are mean-pooled and L2-normalized.
+    """
+    words = text.split()
+    chunks = [
+        " ".join(words[i : i + DOC_CHUNK_WORDS])
+        for i in range(0, len(words), DOC_CHUNK_WORDS)
+    ]
+    if not chunks:
         return []
 
+    vectors = np.asarray(generate_embeddings_batch(chunks), dtype=np.float32)
+    pooled = vectors.mean(axis=0)
+    norm = float(np.sqrt(pooled.dot(pooled)))
+    if norm > 0:
+        pooled /= norm
+    return pooled.tolist()
+
+
+def _as_list(embedding) -> List[float]:
     if hasattr(embedding, "tolist"):
-        emb = embedding.tolist()
-    else:
-        emb = list(embedding)
+        return embedding.tolist()
+    return list(embedding)
+
+
+def query_pinecone_many(embeddings, top_k: int = TOP_K):
+    """Query vs-papers-index with several vectors in a single Vector Search call."""
+    if embeddings is None or len(embeddings) == 0:
+        return []
 
     # Ensure top_k is a sane positive integer (fallback to env default)
     try:
@@ -46,10 +85,41 @@ def query_pinecone(embedding, top_k: int = TOP_K):
     except Exception:
         effective_top_k = TOP_K
 
-    neighbors = query_papers(emb, top_k=effective_top_k)
+    neighbor_lists = query_papers_many(
+        [_as_list(e) for e in embeddings], top_k=effective_top_k
+    )
+
+    # app.py expects [{"matches": [...] }, ...], one entry per query vector
+    return [{"matches": neighbors} for neighbors in neighbor_lists]
 
-    # app.py expects [{"matches": [...] }]
-    return [{"matches": neighbors}]
+
+def query_pinecone(embedding, top_k: int = TOP_K):
+    """Now actually queries Vertex Vector Search vs-papers-index."""
+    if embedding is None:
+        return []
+    return query_pinecone_many([embedding], top_k=top_k)
+
+
+def fuse_matches(match_lists, top_k: int = TOP_K, rrf_k: int = 60):
+    """
+    Reciprocal-rank fusion of several ranked match lists, deduplicated by id.
+
+    Rank-based, so it doesn't care whether the index reports distances or
+    similarities. Each kept match is the copy from its best-ranked list.
+    """
+    fused = {}
+    best = {}
+    for matches in match_lists:
+        for rank, match in enumerate(matches or []):
+            mid = match.get("id")
+            if not mid:
+                continue
+            fused[mid] = fused.get(mid, 0.0) + 1.0 / (rrf_k + rank + 1)
+            if mid not in best or rank < best[mid][0]:
+                best[mid] = (rank, match)
+
+    ranked = sorted(fused, key=fused.get, reverse=True)
+    return [best[mid][1] for mid in ranked[:top_k]]
 
 
 def prompt_to_query(user_prompt: str) -> str:
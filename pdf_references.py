@@ -8,7 +8,7 @@ Intended usage:
 
 import re
 import string
-from typing import Any, Dict, Iterable, List, Mapping, MutableMapping, Set
+from typing import Any, Dict, Iterable, List, Mapping, MutableMapping, Set, Union
 
 try:
     import fitz  # PyMuPDF
@@ -32,9 +32,13 @@ _ARXIV_PATTERN = re.compile(r"arxiv:\s*\d{4}\.\d{4,5}(?:v\d+)?", re.IGNORECASE)
 _URL_PATTERN = re.compile(r"https?://\S+", re.IGNORECASE)
 
 
-def _extract_text(pdf_path: str) -> str:
-    """Extract raw text from a PDF using PyMuPDF."""
-    with fitz.open(pdf_path) as doc:
+def _extract_text(pdf: Union[str, bytes]) -> str:
+    """Extract raw text from a PDF path or in-memory PDF bytes using PyMuPDF."""
+    if isinstance(pdf, (bytes, bytearray)):
+        doc = fitz.open(stream=pdf, filetype="pdf")
+    else:
+        doc = fitz.open(pdf)
+    with doc:
         return "\n".join(page.get_text() for page in doc)
 
 
@@ -92,13 +96,15 @@ def extract_references_from_text(text: str) -> ReferenceMap:
     }
 
 
-def extract_references_from_pdf(pdf_path: str) -> ReferenceMap:
+def extract_references_from_pdf(pdf: Union[str, bytes]) -> ReferenceMap:
     """
     Extract a best-effort set of referenced identifiers (DOIs, arXiv IDs, URLs).
 
+    pdf: a file path or the raw PDF bytes.
+
     Returns: {"doi": set[str], "arxiv": set[str], "url": set[str]}
     """
-    raw_text = _extract_text(pdf_path)
+    raw_text = _extract_text(pdf)
     return extract_references_from_text(raw_text)
 
 
@@ -124,6 +130,8 @@ def annotate_results(results: Iterable[Mapping[str, Any]], references: Reference
     ref_doi = references.get("doi", set())
     ref_arxiv = references.get("arxiv", set())
     ref_url = references.get("url", set())
+    # str.endswith takes a tuple and checks every suffix in C.
+    ref_url_suffixes = tuple(ref_url)
 
     annotated = []
     for item in results:
@@ -139,7 +147,7 @@ def annotate_results(results: Iterable[Mapping[str, Any]], references: Reference
             linked = True
         elif arxiv_id and arxiv_id in ref_arxiv:
             linked = True
-        elif link and (link in ref_url or any(link.endswith(u) for u in ref_url)):
+        elif link and (link in ref_url or (ref_url_suffixes and link.endswith(ref_url_suffixes))):
             linked = True
 
         new_item = dict(item) if isinstance(item, dict) else {"value": item}
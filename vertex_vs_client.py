@@ -37,46 +37,72 @@ if VS_KB_ENDPOINT_NAME and VS_KB_DEPLOYED_INDEX_ID:
     )
 
 
-def _match(
+def _match_many(
     endpoint: aiplatform.MatchingEngineIndexEndpoint,
     deployed_index_id: str,
-    query_vector: List[float],
+    query_vectors: List[List[float]],
     top_k: int,
 ):
     """
     Use find_neighbors (managed Vertex API) instead of low-level .match()
     so we don't hit the ':10000' gRPC private endpoint nonsense.
+
+    All query vectors go out in a single request; returns one neighbor list per query.
     """
     resp = endpoint.find_neighbors(
         deployed_index_id=deployed_index_id,
-        queries=[query_vector],
+        queries=query_vectors,
         num_neighbors=top_k,
         return_full_datapoint=False,  # we get metadata from Firestore, not Vertex
     )
-    return resp[0] if resp else []
+    if not resp:
+        return [[] for _ in query_vectors]
+    return list(resp)
 
 
-def query_papers(query_vector: List[float], top_k: int = 5) -> List[Dict[str, Any]]:
+def _match(
+    endpoint: aiplatform.MatchingEngineIndexEndpoint,
+    deployed_index_id: str,
+    query_vector: List[float],
+    top_k: int,
+):
+    return _match_many(endpoint, deployed_index_id, [query_vector], top_k)[0]
+
+
+def query_papers_many(
+    query_vectors: List[List[float]], top_k: int = 5
+) -> List[List[Dict[str, Any]]]:
     """
-    Query the 'papers' index and hydrate metadata from Firestore.
-    Returns: [{id, score, metadata}, ...]
+    Query the 'papers' index with several vectors in one round-trip and hydrate
+    metadata for the union of hits with a single Firestore batch read.
+    Returns: one [{id, score, metadata}, ...] list per query vector.
     """
-    neighbors = _match(_papers_endpoint, VS_PAPERS_DEPLOYED_INDEX_ID, query_vector, top_k)
-    ids = [n.id for n in neighbors]
+    neighbor_lists = _match_many(
+        _papers_endpoint, VS_PAPERS_DEPLOYED_INDEX_ID, query_vectors, top_k
+    )
+    ids = list(dict.fromkeys(n.id for neighbors in neighbor_lists for n in neighbors))
 
     meta_by_id = get_papers_metadata(ids)
 
-    results: List[Dict[str, Any]] = []
-    for n in neighbors:
-        pid = n.id
-        results.append(
+    return [
+        [
             {
-                "id": pid,
+                "id": n.id,
                 "score": n.distance,
-                "metadata": meta_by_id.get(pid, {}),
+                "metadata": meta_by_id.get(n.id, {}),
             }
-        )
-    return results
+            for n in neighbors
+        ]
+        for neighbors in neighbor_lists
+    ]
+
+
+def query_papers(query_vector: List[float], top_k: int = 5) -> List[Dict[str, Any]]:
+    """
+    Query the 'papers' index and hydrate metadata from Firestore.
+    Returns: [{id, score, metadata}, ...]
+    """
+    return query_papers_many([query_vector], top_k=top_k)[0]
 
 
 def query_kb(query_vector: List[float], top_k: int = 5) -> List[Dict[str, Any]]: